@@ -0,0 +1,42 @@
+# app/api/debug.py
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+
+from app.deps import dev_auth
+from app.profiling import get_profile, recent_profiles, render_text, require_profile_token
+
+router = APIRouter(
+    prefix="/v1/debug",
+    tags=["debug"],
+    dependencies=[Depends(dev_auth), Depends(require_profile_token)],
+)
+
+
+@router.get("/profiles", summary="List recently captured request profiles")
+def list_profiles():
+    return [p.summary() for p in reversed(recent_profiles())]
+
+
+@router.get("/profiles/{profile_id}", summary="Download one request profile")
+def download_profile(
+    profile_id: str,
+    format: str = Query("pstats", pattern="^(pstats|text|json)$"),
+):
+    """
+    `pstats` returns a file loadable with `pstats.Stats(path)` / snakeviz,
+    `text` the top functions by cumulative time, `json` just the summary.
+    """
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return profile.summary()
+    if profile.stats is None:
+        raise HTTPException(status_code=404, detail="No cProfile data captured for this request")
+    if format == "text":
+        return PlainTextResponse(render_text(profile))
+    return Response(
+        content=profile.stats,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'},
+    )
@@ -0,0 +1,206 @@
+# app/api/exports.py
+import csv
+import io
+import json
+import logging
+import re
+import zlib
+from typing import Any, Dict, Iterator
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app import models
+from app.config import EXPORT_YIELD_PER
+from app.db import read_engine
+from app.deps import dev_auth
+from app.profiling import ProfiledRoute
+
+logger = logging.getLogger("uvicorn.error")
+
+router = APIRouter(prefix="/v1", tags=["exports"], dependencies=[Depends(dev_auth)], route_class=ProfiledRoute)
+
+CSV_FIELDS = [
+    "type",
+    "id",
+    "userId",
+    "name",
+    "createdAt",
+    "patientId",
+    "patientName",
+    "status",
+    "startTime",
+    "templateId",
+    "sessionId",
+    "chunkNumber",
+    "storagePath",
+    "publicUrl",
+    "mimeType",
+    "isLast",
+    "totalChunksClient",
+]
+
+
+def _iter_records(user_id: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every patient, session and chunk row for `user_id` from a single
+    read transaction (on the replica when configured), using a server-side cursor so rows are never all in
+    memory at once.
+    """
+    # One snapshot for all three queries. Postgres needs REPEATABLE READ for
+    # that. pysqlite never sends BEGIN before a SELECT, so on SQLite we issue
+    # it ourselves; the database runs in WAL mode (app.db), so the open read
+    # transaction does not block chunk ingest while the export streams.
+    sqlite = read_engine.dialect.name == "sqlite"
+    conn = read_engine.connect()
+    if not sqlite:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+    with conn:
+        with conn.begin():
+            if sqlite:
+                conn.exec_driver_sql("BEGIN")
+            stream = conn.execution_options(stream_results=True, yield_per=EXPORT_YIELD_PER)
+
+            P = models.Patient
+            for row in stream.execute(
+                select(P.id, P.user_id, P.name, P.created_at)
+                .where(P.user_id == user_id)
+                .order_by(P.id)
+            ):
+                yield {
+                    "type": "patient",
+                    "id": row.id,
+                    "userId": row.user_id,
+                    "name": row.name,
+                    "createdAt": row.created_at,
+                }
+
+            S = models.Session
+            for row in stream.execute(
+                select(S.id, S.patient_id, S.user_id, S.patient_name, S.status, S.start_time, S.template_id)
+                .where(S.user_id == user_id)
+                .order_by(S.id)
+            ):
+                yield {
+                    "type": "session",
+                    "id": row.id,
+                    "patientId": row.patient_id,
+                    "userId": row.user_id,
+                    "patientName": row.patient_name,
+                    "status": row.status,
+                    "startTime": row.start_time,
+                    "templateId": row.template_id,
+                }
+
+            C = models.AudioChunk
+            for row in stream.execute(
+                select(
+                    C.id,
+                    C.session_id,
+                    C.chunk_number,
+                    C.gcs_path,
+                    C.public_url,
+                    C.mime_type,
+                    C.is_last,
+                    C.total_chunks_client,
+                    C.created_at,
+                )
+                .join(S, S.id == C.session_id)
+                .where(S.user_id == user_id)
+                .order_by(C.session_id, C.chunk_number)
+            ):
+                yield {
+                    "type": "chunk",
+                    "id": row.id,
+                    "sessionId": row.session_id,
+                    "chunkNumber": row.chunk_number,
+                    "storagePath": row.gcs_path,
+                    "publicUrl": row.public_url,
+                    "mimeType": row.mime_type,
+                    "isLast": row.is_last,
+                    "totalChunksClient": row.total_chunks_client,
+                    "createdAt": row.created_at,
+                }
+
+
+def _ndjson_lines(records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    for rec in records:
+        yield (json.dumps(rec, default=str) + "\n").encode("utf-8")
+
+
+def _csv_lines(records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for rec in records:
+        writer.writerow(rec)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate(0)
+    # flush the header when there are no rows at all
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _batched(chunks: Iterator[bytes], size: int = 64 * 1024) -> Iterator[bytes]:
+    # one network write per ~64KB instead of one per row
+    pending = []
+    pending_len = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_len += len(chunk)
+        if pending_len >= size:
+            yield b"".join(pending)
+            pending = []
+            pending_len = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def _gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+@router.get(
+    "/export",
+    summary="Stream all patients, sessions and chunk metadata for a userId",
+)
+def export_user_data(
+    userId: str = Query(..., description="External user id"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Gzip the stream on the fly"),
+):
+    """
+    Streams one record per line (`type` = patient / session / chunk).
+
+    Memory stays flat regardless of volume: rows come from a server-side
+    cursor and are encoded as they arrive.
+    """
+    encode = _ndjson_lines if format == "ndjson" else _csv_lines
+    body = _batched(encode(_iter_records(userId)))
+    if gzip:
+        body = _gzipped(body)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    suffix = f".{format}" + (".gz" if gzip else "")
+    # ASCII-only fallback name plus the exact id as RFC 5987 filename*
+    safe_id = re.sub(r"[^A-Za-z0-9._-]", "_", userId)
+    headers = {
+        "Content-Disposition": (
+            f'attachment; filename="export_{safe_id}{suffix}"; '
+            f"filename*=UTF-8''{quote(f'export_{userId}{suffix}', safe='')}"
+        )
+    }
+    if gzip:
+        # served as a .gz download rather than Content-Encoding so clients
+        # keep the compressed file instead of transparently inflating it
+        media_type = "application/gzip"
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
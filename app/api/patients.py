@@ -1,22 +1,24 @@
 # app/api/patients.py
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.db import engine
+from sqlalchemy import func, text
+from app.db import engine, patient_fts_available
 
-from app import models, schemas
-from app.deps import get_db, dev_auth
+from app import idempotency, models, schemas
+from app.deps import get_db, get_read_db, dev_auth
+from app.profiling import ProfiledRoute
 
 # Main router for /v1/... endpoints
-router = APIRouter(prefix="/v1", tags=["patients"], dependencies=[Depends(dev_auth)])
+router = APIRouter(prefix="/v1", tags=["patients"], dependencies=[Depends(dev_auth)], route_class=ProfiledRoute)
 logger = logging.getLogger("uvicorn.error")
 
 # Separate router for the weird user endpoint from Postman: /users/asd3fd2faec
-user_router = APIRouter(tags=["users"], dependencies=[Depends(dev_auth)])
+user_router = APIRouter(tags=["users"], dependencies=[Depends(dev_auth)], route_class=ProfiledRoute)
 
 
 # ---------------------------------------------------------------------------
@@ -30,7 +32,7 @@ user_router = APIRouter(tags=["users"], dependencies=[Depends(dev_auth)])
 )
 def list_patients(
     userId: str = Query(..., description="External user id (e.g. auth user)"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Return all patients that belong to the given `userId`.
@@ -58,6 +60,89 @@ def list_patients(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@router.get(
+    "/patients/search",
+    response_model=List[schemas.PatientOut],
+    summary="Search a user's patients by name",
+)
+def search_patients(
+    userId: str = Query(..., description="External user id (e.g. auth user)"),
+    q: str = Query(..., min_length=1, description="Case-insensitive name fragment"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Case-insensitive prefix + substring search over `Patient.name`.
+
+    Prefix matches are returned first (served by the per-user name index),
+    and only if there is room left do we fall back to substring matches
+    (pg_trgm on Postgres, the patients_fts trigram table on SQLite). Within
+    each group shorter names rank first.
+    """
+    try:
+        raw = q.strip().lower()
+        term = _escape_like(raw)
+        if not term:
+            return []
+
+        # SQLite LIKE is already case-insensitive and can only use the
+        # NOCASE index on the bare column; Postgres indexes lower(name).
+        bind = db.get_bind()
+        sqlite = bind.dialect.name == "sqlite"
+        if sqlite:
+            name_col = models.Patient.name
+        else:
+            name_col = func.lower(models.Patient.name)
+
+        base = db.query(models.Patient).filter(models.Patient.user_id == userId)
+        ordering = (func.length(models.Patient.name), models.Patient.name, models.Patient.id)
+        prefix = name_col.like(f"{term}%", escape="\\")
+
+        patients = (
+            base.filter(prefix)
+            .order_by(*ordering)
+            .limit(limit)
+            .all()
+        )
+        if len(patients) < limit:
+            if not sqlite:
+                substring = name_col.like(f"%{term}%", escape="\\")
+            elif len(raw) >= 3 and patient_fts_available(bind):
+                # trigram phrase query == case-insensitive substring match
+                phrase = '"' + raw.replace('"', '""') + '"'
+                substring = models.Patient.id.in_(
+                    text("SELECT rowid FROM patients_fts WHERE patients_fts MATCH :phrase").bindparams(phrase=phrase)
+                )
+            else:
+                # too short for trigrams (or no FTS5): a substring match
+                # would scan the whole panel, so only prefixes are served
+                substring = None
+            if substring is not None:
+                patients += (
+                    base.filter(substring)
+                    .filter(~prefix)
+                    .order_by(*ordering)
+                    .limit(limit - len(patients))
+                    .all()
+                )
+
+        return [
+            schemas.PatientOut(
+                id=p.id,
+                name=p.name,
+                userId=p.user_id,
+            )
+            for p in patients
+        ]
+    except Exception as e:
+        logger.exception("search_patients failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post(
     "/add-patient-ext",
     response_model=schemas.PatientOut,
@@ -66,6 +151,7 @@ def list_patients(
 def create_patient(
     body: schemas.PatientCreate,
     db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
 ):
     """
     Create a patient.
@@ -76,7 +162,14 @@ def create_patient(
       "name": "...",
       "userId": "..."
     }
+
+    With an `Idempotency-Key` header, retries with the same key and body
+    get the original response back instead of creating another patient.
     """
+    replayed = idempotency.replay(db, "add-patient-ext", idempotency_key, body)
+    if replayed is not None:
+        return replayed
+
     try:
         next_id = None
         try:
@@ -95,13 +188,23 @@ def create_patient(
             user_id=body.userId,
         )
         db.add(patient)
-        db.commit()
-        db.refresh(patient)
-        return schemas.PatientOut(
+        db.flush()
+        out = schemas.PatientOut(
             id=patient.id,
             name=patient.name,
             userId=patient.user_id,
         )
+        idempotency.record(db, "add-patient-ext", idempotency_key, body, out.model_dump())
+        db.commit()
+        return out
+    except IntegrityError:
+        db.rollback()
+        # a concurrent retry with the same Idempotency-Key committed first
+        replayed = idempotency.replay(db, "add-patient-ext", idempotency_key, body)
+        if replayed is not None:
+            return replayed
+        logger.exception("create_patient failed")
+        raise HTTPException(status_code=409, detail="Patient could not be created (conflict)")
     except Exception as e:
         try:
             db.rollback()
@@ -117,7 +220,7 @@ def create_patient(
 )
 def get_patient_details(
     patientId: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     try:
         patient = (
@@ -145,7 +248,7 @@ def get_patient_details(
 )
 def get_sessions_by_patient(
     patientId: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     try:
         sessions = (
@@ -177,7 +280,7 @@ def get_sessions_by_patient(
 )
 def get_all_sessions(
     userId: str = Query(..., description="External user id"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     try:
         sessions = (
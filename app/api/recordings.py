@@ -1,18 +1,26 @@
 # app/api/recordings.py
-from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import Any
+from typing import Any, Optional
+import asyncio
+import json
 import os
 import uuid
 import logging
 
 from app.deps import get_db, dev_auth
-from app import models, schemas
-from app.config import FILE_STORAGE_DIR
+from app import idempotency, models, schemas
+from app.config import COMPACTION_ENABLED, FILE_STORAGE_DIR, SSE_KEEPALIVE_SECONDS
+from app.compaction import compact_session, read_chunk
+from app.events import get_broker, publish_session_event, session_topic, user_topic
+from app.jobs import enqueue_session_job, release_if_complete
+from app.profiling import ProfiledRoute
 
 logger = logging.getLogger("uvicorn.error")
 
-router = APIRouter(prefix="/v1", tags=["recordings"])
+router = APIRouter(prefix="/v1", tags=["recordings"], route_class=ProfiledRoute)
 
 # Ensure storage dir exists
 os.makedirs(FILE_STORAGE_DIR, exist_ok=True)
@@ -23,10 +31,21 @@ os.makedirs(FILE_STORAGE_DIR, exist_ok=True)
     # IMPORTANT: removed response_model=schemas.SessionCreateResponse to avoid the AttributeError
     dependencies=[Depends(dev_auth)],
 )
-def create_session(body: schemas.SessionCreate, db: Session = Depends(get_db)):
+def create_session(
+    body: schemas.SessionCreate,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+):
     """
     Creates a new session row and returns a generated sessionId.
+
+    With an `Idempotency-Key` header, retries with the same key and body
+    get the original sessionId back instead of a new session.
     """
+    replayed = idempotency.replay(db, "upload-session", idempotency_key, body)
+    if replayed is not None:
+        return replayed
+
     # verify patient exists
     patient = db.query(models.Patient).filter(models.Patient.id == body.patientId).first()
     if not patient:
@@ -44,7 +63,18 @@ def create_session(body: schemas.SessionCreate, db: Session = Depends(get_db)):
         template_id=body.templateId,
     )
     db.add(s)
-    db.commit()
+    idempotency.record(db, "upload-session", idempotency_key, body, {"sessionId": session_id})
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        # a concurrent retry with the same Idempotency-Key committed first
+        replayed = idempotency.replay(db, "upload-session", idempotency_key, body)
+        if replayed is not None:
+            return replayed
+        raise
+
+    publish_session_event("session.created", session_id, body.userId, status=body.status, patientId=body.patientId)
 
     # return plain dict, no schema needed
     return {"sessionId": session_id}
@@ -138,7 +168,11 @@ async def upload_chunk(
     response_model=schemas.NotifyChunkResponse,
     dependencies=[Depends(dev_auth)],
 )
-def notify_chunk_uploaded(body: schemas.NotifyChunkRequest, db: Session = Depends(get_db)):
+def notify_chunk_uploaded(
+    body: schemas.NotifyChunkRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     """
     After the client has uploaded the chunk via /upload-chunk, they call this
     to store the chunk metadata in the database.
@@ -159,6 +193,116 @@ def notify_chunk_uploaded(body: schemas.NotifyChunkRequest, db: Session = Depend
         total_chunks_client=body.totalChunksClient,
     )
     db.add(chunk)
+    db.flush()
+
+    user_id = db.query(models.Session.user_id).filter(models.Session.id == body.sessionId).scalar()
+
+    # Final chunk: the processing job is written in the same transaction as
+    # the chunk, so a crash can't leave a last chunk without its job. It only
+    # becomes runnable once every earlier chunk has landed, which may be on a
+    # later notify.
+    if body.isLast:
+        enqueue_session_job(
+            db,
+            body.sessionId,
+            user_id,
+            model=body.model,
+            template=body.selectedTemplate,
+            template_id=body.selectedTemplateId,
+        )
+    release_if_complete(db, body.sessionId)
     db.commit()
 
+    publish_session_event(
+        "chunk.uploaded",
+        body.sessionId,
+        user_id,
+        chunkNumber=body.chunkNumber,
+        isLast=body.isLast,
+        totalChunksClient=body.totalChunksClient,
+        downloadUrl=public_url,
+    )
+
+    # Once the last chunk is in (it may arrive before a straggler), try to
+    # fold the session into a single archive object after responding.
+    if COMPACTION_ENABLED:
+        has_last = body.isLast or (
+            db.query(models.AudioChunk.id)
+            .filter(models.AudioChunk.session_id == body.sessionId, models.AudioChunk.is_last.is_(True))
+            .first()
+            is not None
+        )
+        if has_last:
+            background_tasks.add_task(compact_session, body.sessionId)
+
     return schemas.NotifyChunkResponse(success=True, downloadUrl=public_url)
+
+
+@router.get(
+    "/sessions/{session_id}/chunks/{chunk_number}",
+    dependencies=[Depends(dev_auth)],
+)
+def get_chunk(session_id: str, chunk_number: int, db: Session = Depends(get_db)):
+    """
+    Returns the raw audio for one chunk, whether it is still a separate
+    object or has been compacted into the session archive.
+    """
+    try:
+        found = read_chunk(db, session_id, chunk_number)
+    except Exception as e:
+        logger.error("Failed to read chunk %s/%s: %s", session_id, chunk_number, str(e))
+        raise HTTPException(status_code=500, detail=f"Read failed: {str(e)}")
+    if found is None:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    content, mime_type = found
+    return Response(content=content, media_type=mime_type)
+
+
+async def _sse_stream(request: Request, topic: str):
+    broker = get_broker()
+    sub = broker.subscribe(topic)
+    try:
+        yield f": subscribed {topic}\n\n"
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                event = await asyncio.wait_for(sub.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+    finally:
+        broker.unsubscribe(sub)
+
+
+def _sse_response(request: Request, topic: str) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_stream(request, topic),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/sessions/{session_id}/events",
+    dependencies=[Depends(dev_auth)],
+)
+async def session_events(session_id: str, request: Request):
+    """
+    Server-Sent Events stream for one session: `chunk.uploaded` whenever a
+    chunk is recorded and `session.*` events when the session changes.
+    """
+    return _sse_response(request, session_topic(session_id))
+
+
+@router.get(
+    "/user-events",
+    dependencies=[Depends(dev_auth)],
+)
+async def user_events(request: Request, userId: str = Query(..., description="External user id")):
+    """
+    Server-Sent Events stream for every session owned by `userId`.
+    """
+    return _sse_response(request, user_topic(userId))
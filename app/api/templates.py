@@ -1,28 +1,46 @@
 # app/api/templates.py
 from fastapi import APIRouter, Depends, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.deps import get_db, dev_auth
+from app.deps import get_db, get_read_db, dev_auth
 from app import models, schemas
+from app.profiling import ProfiledRoute
 
-router = APIRouter(prefix="/v1", tags=["templates"])
+router = APIRouter(prefix="/v1", tags=["templates"], route_class=ProfiledRoute)
 
 @router.get("/fetch-default-template-ext", response_model=List[schemas.TemplateOut], dependencies=[Depends(dev_auth)])
-def get_user_templates(userId: str = Query(...), db: Session = Depends(get_db)):
+def get_user_templates(
+    userId: str = Query(...),
+    read_db: Session = Depends(get_read_db),
+    db: Session = Depends(get_db),
+):
     # For simplicity: return all templates where user_id == userId OR user_id is null (defaults)
-    templates = (
-        db.query(models.Template)
-        .filter((models.Template.user_id == userId) | (models.Template.user_id == None))  # noqa: E711
-        .all()
-    )
+    # `db` (primary) is only touched when the replica comes back empty
+    def visible(session: Session):
+        return (
+            session.query(models.Template)
+            .filter((models.Template.user_id == userId) | (models.Template.user_id == None))  # noqa: E711
+            .all()
+        )
+
+    templates = visible(read_db)
+    if not templates:
+        # replica may just be lagging; only seed if the primary is empty too
+        templates = visible(db)
     if not templates:
         # seed one default if empty
         default = models.Template(template_id="new_patient_visit", name="New Patient Visit", user_id=None)
         db.add(default)
-        db.commit()
-        db.refresh(default)
-        templates = [default]
+        try:
+            db.commit()
+            db.refresh(default)
+            templates = [default]
+        except IntegrityError:
+            # another request seeded it first
+            db.rollback()
+            templates = visible(db)
 
     return [
         schemas.TemplateOut(templateId=t.template_id, name=t.name)
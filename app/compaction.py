@@ -0,0 +1,238 @@
+# app/compaction.py
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import COMPACTION_ENABLED, COMPACTION_SWEEP_SECONDS
+from app.db import SessionLocal
+from app.events import publish_session_event
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def archive_path(session_id: str) -> str:
+    return f"sessions/{session_id}/archive.bin"
+
+
+def complete_chunks(db: Session, session_id: str) -> Optional[List[models.AudioChunk]]:
+    """
+    Return the session's chunks ordered by chunk_number if the last chunk has
+    arrived and there are no gaps before it, otherwise None. Retried notifies
+    can leave several rows per chunk_number; the newest one wins.
+    """
+    rows = (
+        db.query(models.AudioChunk)
+        .filter(models.AudioChunk.session_id == session_id)
+        .order_by(models.AudioChunk.chunk_number, models.AudioChunk.id)
+        .all()
+    )
+    by_number: Dict[int, models.AudioChunk] = {}
+    last_number = None
+    for row in rows:
+        by_number[row.chunk_number] = row
+        if row.is_last:
+            last_number = row.chunk_number
+            if row.total_chunks_client:
+                last_number = max(last_number, row.total_chunks_client - 1)
+    if last_number is None:
+        return None
+    if any(n not in by_number for n in range(last_number + 1)):
+        return None
+    return [by_number[n] for n in range(last_number + 1)]
+
+
+def compact_session(session_id: str) -> bool:
+    """
+    Concatenate a finished session's chunk objects into one archive object,
+    record each chunk's (offset, length) and delete the per-chunk objects.
+
+    Safe to call repeatedly: incomplete sessions are skipped, and archived
+    sessions only get their leftover chunk objects removed. The archive row
+    is committed before anything is deleted, so a crash part-way leaves
+    extra objects behind (cleaned up by the sweeper), never missing audio.
+    """
+    from app.supabase_storage import download_object, upload_file
+
+    db = SessionLocal()
+    tmp_path = None
+    try:
+        archive = db.get(models.SessionArchive, session_id)
+        if archive is not None:
+            if not archive.chunks_removed:
+                _remove_chunk_objects(db, archive)
+            return False
+        chunks = complete_chunks(db, session_id)
+        if chunks is None:
+            logger.info("Compaction: session %s not complete yet, skipping", session_id)
+            return False
+
+        index: List[Tuple[int, int, int]] = []
+        offset = 0
+        with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as tmp:
+            tmp_path = tmp.name
+            for chunk in chunks:
+                data = download_object(chunk.gcs_path)
+                tmp.write(data)
+                index.append((chunk.chunk_number, offset, len(data)))
+                offset += len(data)
+
+        path = archive_path(session_id)
+        upload_file(tmp_path, path, "application/octet-stream")
+
+        archive = models.SessionArchive(
+            session_id=session_id,
+            storage_path=path,
+            chunk_index=json.dumps(index, separators=(",", ":")),
+            total_bytes=offset,
+            chunks_removed=False,
+        )
+        db.add(archive)
+        # Archive state lives in session_archives only; Session.status is
+        # left to the client and the processing queue.
+        user_id = db.query(models.Session.user_id).filter(models.Session.id == session_id).scalar()
+        db.commit()
+
+        _remove_chunk_objects(db, archive)
+
+        logger.info("Compaction: archived %s chunks (%s bytes) for %s", len(index), offset, session_id)
+        publish_session_event("session.archived", session_id, user_id, chunks=len(index))
+        return True
+    except IntegrityError:
+        # another worker archived it first
+        db.rollback()
+        return False
+    except Exception:
+        db.rollback()
+        logger.exception("Compaction of session %s failed", session_id)
+        return False
+    finally:
+        db.close()
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _remove_chunk_objects(db: Session, archive: models.SessionArchive) -> None:
+    """
+    Delete the per-chunk objects of an archived session and clear their
+    public URLs (the audio is served by /v1/sessions/{id}/chunks/{n} from
+    now on). On failure chunks_removed stays False and the sweeper retries.
+    """
+    from app.supabase_storage import remove_objects
+
+    session_id = archive.session_id
+    # Every row for the session, including superseded retries
+    stale = {
+        p for (p,) in db.query(models.AudioChunk.gcs_path)
+        .filter(models.AudioChunk.session_id == session_id)
+    }
+    try:
+        remove_objects(sorted(stale))
+    except Exception as e:
+        db.rollback()
+        logger.warning("Compaction: removing chunk objects for %s failed: %s", session_id, e)
+        return
+    db.query(models.AudioChunk).filter(models.AudioChunk.session_id == session_id).update(
+        {models.AudioChunk.public_url: None}, synchronize_session=False
+    )
+    archive.chunks_removed = True
+    db.commit()
+
+
+def sweep() -> int:
+    """
+    Retry compaction for sessions the notify-time trigger missed (failed
+    task, restart) and finish archives whose chunk objects were not removed.
+    Returns how many sessions were newly archived.
+    """
+    C, A = models.AudioChunk, models.SessionArchive
+    db = SessionLocal()
+    try:
+        pending = [
+            sid for (sid,) in db.query(C.session_id)
+            .filter(C.is_last.is_(True))
+            .filter(~exists().where(A.session_id == C.session_id))
+            .distinct()
+        ]
+        pending += [sid for (sid,) in db.query(A.session_id).filter(A.chunks_removed.is_(False))]
+    finally:
+        db.close()
+    return sum(1 for sid in pending if compact_session(sid))
+
+
+class CompactionSweeper:
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, interval: float = COMPACTION_SWEEP_SECONDS) -> None:
+        if self._thread is not None or not COMPACTION_ENABLED or interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="compaction-sweep", daemon=True)
+        self._thread.start()
+        logger.info("Compaction: sweeping every %ss", interval)
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                archived = sweep()
+                if archived:
+                    logger.info("Compaction: sweep archived %s sessions", archived)
+            except Exception:
+                logger.exception("Compaction: sweep failed")
+
+
+_sweeper = CompactionSweeper()
+
+
+def start_sweeper() -> None:
+    _sweeper.start()
+
+
+def stop_sweeper() -> None:
+    _sweeper.stop()
+
+
+def read_chunk(db: Session, session_id: str, chunk_number: int) -> Optional[Tuple[bytes, str]]:
+    """
+    Return (content, mime_type) for one chunk, served as a byte range of the
+    archive when the session has been compacted. None if the chunk is unknown.
+    """
+    from app.supabase_storage import download_object, download_range
+
+    chunk = (
+        db.query(models.AudioChunk)
+        .filter(models.AudioChunk.session_id == session_id)
+        .filter(models.AudioChunk.chunk_number == chunk_number)
+        .order_by(models.AudioChunk.id.desc())
+        .first()
+    )
+    mime_type = (chunk.mime_type if chunk else None) or "application/octet-stream"
+
+    archive = db.get(models.SessionArchive, session_id)
+    if archive is not None:
+        for number, offset, length in json.loads(archive.chunk_index):
+            if number == chunk_number:
+                return download_range(archive.storage_path, offset, length), mime_type
+        return None
+
+    if chunk is None:
+        return None
+    return download_object(chunk.gcs_path), mime_type
@@ -5,6 +5,10 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./medi.db")
+# Optional read replica used by GET routes; unset = everything on DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+# After a client writes, its reads go to the primary for this long (replica lag)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
 DEV_AUTH_TOKEN = os.getenv("DEV_AUTH_TOKEN", "testtoken")
 
 FILE_STORAGE_DIR = os.getenv("FILE_STORAGE_DIR", "./data/audio")
@@ -12,3 +16,38 @@ FILE_STORAGE_DIR = os.getenv("FILE_STORAGE_DIR", "./data/audio")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "audio-chunks")
+
+# Live session events (SSE). "memory" = single process, "postgres" = LISTEN/NOTIFY across workers
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory").lower()
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Rows fetched per round trip by the streaming export cursor
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+
+# Merge a finished session's chunk objects into one archive object (deletes the per-chunk objects)
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "false").lower() in ("1", "true", "yes")
+# How often the compaction sweeper retries sessions that were missed or half-finished
+COMPACTION_SWEEP_SECONDS = float(os.getenv("COMPACTION_SWEEP_SECONDS", "300"))
+
+# Request profiling: send "X-Profile: <PROFILE_TOKEN>" to profile one request,
+# or set PROFILE_SAMPLE_RATE (0..1) to profile a random fraction
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+
+# Idempotency-Key replay window and in-memory front cache size
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "2048"))
+
+# Post-upload processing queue (runs when a session's last chunk lands)
+# "package.module:ClassName". Unset = no workers start (jobs stay queued);
+# "app.jobs:StubEngine" does no work and is for tests and local runs only.
+JOB_ENGINE = os.getenv("JOB_ENGINE")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # take any lane, fast first
+JOB_FAST_WORKERS = int(os.getenv("JOB_FAST_WORKERS", "1"))  # reserved for the fast lane
+JOB_USER_CONCURRENCY = int(os.getenv("JOB_USER_CONCURRENCY", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
@@ -1,35 +1,70 @@
 # app/db.py
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy import inspect
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
-from app.config import DATABASE_URL
+from app.config import DATABASE_URL, DATABASE_READ_URL
 import logging
 
 logger = logging.getLogger("uvicorn.error")
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    connect_args=connect_args,
-    poolclass=None if not DATABASE_URL.startswith("sqlite") else NullPool,
-)
+def _make_engine(url: str):
+    connect_args = {}
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+    eng = create_engine(
+        url,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+        poolclass=None if not url.startswith("sqlite") else NullPool,
+    )
+    if url.startswith("sqlite"):
+        # WAL lets a long read transaction (the export snapshot) run
+        # alongside writers instead of locking them out
+        event.listen(eng, "connect", _sqlite_wal)
+    return eng
+
+
+def _sqlite_wal(dbapi_conn, connection_record):
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute("PRAGMA journal_mode=WAL")
+    finally:
+        cur.close()
+
+
+engine = _make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica for GET routes. Without DATABASE_READ_URL both names
+# point at the primary, so callers never need to check.
+if DATABASE_READ_URL:
+    read_engine = _make_engine(DATABASE_READ_URL)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
+
 def init_db():
     from app import models  # noqa
     try:
         models.Base.metadata.create_all(bind=engine)
         logger.info("Database tables created / verified successfully.")
+        if read_engine is not engine and read_engine.dialect.name == "sqlite":
+            # local two-file replica setup: make sure the read side has tables too
+            models.Base.metadata.create_all(bind=read_engine)
         try:
             _ensure_schema()
         except Exception as e:
             logger.warning("Schema ensure step failed: %s", e)
+        try:
+            _ensure_search_indexes()
+            if read_engine is not engine and read_engine.dialect.name == "sqlite":
+                _ensure_search_indexes(read_engine)
+        except Exception as e:
+            logger.warning("Search index step failed: %s", e)
     except Exception as e:
         logger.exception("Error creating DB tables: %s", e)
         raise
@@ -62,3 +97,74 @@ def _ensure_schema():
                 conn.execute(text("ALTER TABLE patients ALTER COLUMN id SET DEFAULT nextval('patients_id_seq')"))
                 conn.execute(text("SELECT setval('patients_id_seq', COALESCE((SELECT MAX(id) FROM patients), 0))"))
                 logger.info("Set patients.id default from sequence")
+
+
+# URLs of SQLite databases whose patients_fts table is in place
+_patient_fts_ready = set()
+
+
+def patient_fts_available(bind) -> bool:
+    return str(bind.url) in _patient_fts_ready
+
+
+def _ensure_search_indexes(eng=None):
+    # Backs /v1/patients/search. Postgres gets a trigram index on lower(name)
+    # for substring matches plus a per-user pattern index for prefixes.
+    # SQLite gets a per-user NOCASE index for prefixes and an FTS5 trigram
+    # table (kept in sync by triggers) for substrings.
+    eng = eng or engine
+    if eng.dialect.name == "postgresql":
+        # separate transactions: without the extension privilege the
+        # prefix index must still be created
+        try:
+            with eng.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_patients_name_trgm "
+                    "ON patients USING gin (lower(name) gin_trgm_ops)"
+                ))
+        except Exception as e:
+            logger.warning("pg_trgm index not created, substring search will scan: %s", e)
+        with eng.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_patients_user_id_lower_name "
+                "ON patients (user_id, lower(name) text_pattern_ops)"
+            ))
+    elif eng.dialect.name == "sqlite":
+        with eng.begin() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_patients_user_id_name_nocase "
+                "ON patients (user_id, name COLLATE NOCASE)"
+            ))
+        try:
+            _ensure_patient_fts(eng)
+            _patient_fts_ready.add(str(eng.url))
+        except Exception as e:
+            logger.warning("FTS5 trigram table not created, substring search disabled: %s", e)
+    logger.info("Patient search indexes created / verified successfully.")
+
+
+def _ensure_patient_fts(eng):
+    with eng.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='patients_fts'"
+        )).scalar()
+        if not exists:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE patients_fts USING fts5("
+                "name, content='patients', content_rowid='id', tokenize='trigram')"
+            ))
+            conn.execute(text("INSERT INTO patients_fts(patients_fts) VALUES ('rebuild')"))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON patients BEGIN "
+            "INSERT INTO patients_fts(rowid, name) VALUES (new.id, new.name); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON patients BEGIN "
+            "INSERT INTO patients_fts(patients_fts, rowid, name) VALUES ('delete', old.id, old.name); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE OF name ON patients BEGIN "
+            "INSERT INTO patients_fts(patients_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+            "INSERT INTO patients_fts(rowid, name) VALUES (new.id, new.name); END"
+        ))
@@ -1,11 +1,115 @@
 # app/deps.py
-from fastapi import Depends, HTTPException, Header
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Depends, HTTPException, Header, Request
+from sqlalchemy import event
 from sqlalchemy.orm import Session
-from app.db import SessionLocal
-from app.config import DEV_AUTH_TOKEN
+from app import models
+from app.db import SessionLocal, ReadSessionLocal
+from app.config import DEV_AUTH_TOKEN, READ_YOUR_WRITES_SECONDS
+
+# Read-your-writes marks -> monotonic time of the last committed write (bounded
+# LRU). Kept in process memory: with several uvicorn workers a read only sees
+# marks made by the same worker, so run one worker per replica-backed
+# deployment or set READ_YOUR_WRITES_SECONDS high enough to cover sticky routing.
+_MAX_TRACKED_CLIENTS = 10000
+_last_write: "OrderedDict[str, float]" = OrderedDict()
+_last_write_lock = threading.Lock()
+
+
+def _client_key(request: Request) -> Optional[str]:
+    # Optional per-device key. The peer IP is not used: behind a proxy every
+    # client shares it, and constant chunk ingest would pin all reads to the
+    # primary.
+    value = request.headers.get("x-client-id")
+    return f"client:{value}" if value else None
+
+
+def _read_keys(request: Request) -> List[str]:
+    # What a read route is scoped by: the userId query parameter most list
+    # routes take, the patientId path parameter of the per-patient routes,
+    # and X-Client-Id if the client sends one.
+    keys = []
+    user_id = request.query_params.get("userId")
+    if user_id:
+        keys.append(f"user:{user_id}")
+    patient_id = request.path_params.get("patientId")
+    if patient_id is not None:
+        keys.append(f"patient:{patient_id}")
+    client = _client_key(request)
+    if client:
+        keys.append(client)
+    return keys
+
+
+def _write_keys(obj) -> List[str]:
+    keys = []
+    user_id = getattr(obj, "user_id", None)
+    if user_id:
+        keys.append(f"user:{user_id}")
+    patient_id = obj.id if isinstance(obj, models.Patient) else getattr(obj, "patient_id", None)
+    if patient_id is not None:
+        keys.append(f"patient:{patient_id}")
+    return keys
+
+
+def _mark_write(key: str) -> None:
+    with _last_write_lock:
+        _last_write[key] = time.monotonic()
+        _last_write.move_to_end(key)
+        while len(_last_write) > _MAX_TRACKED_CLIENTS:
+            _last_write.popitem(last=False)
+
+
+def _wrote_recently(keys: List[str]) -> bool:
+    now = time.monotonic()
+    with _last_write_lock:
+        return any(now - _last_write.get(key, float("-inf")) < READ_YOUR_WRITES_SECONDS for key in keys)
+
 
-def get_db():
+@event.listens_for(SessionLocal, "after_flush")
+def _note_flush(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush sets here, with ids assigned
+    written = session.info.setdefault("written_keys", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        written.update(_write_keys(obj))
+    if session.info.get("client_key"):
+        written.add(session.info["client_key"])
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _note_commit(session):
+    for key in session.info.pop("written_keys", ()):
+        _mark_write(key)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _note_rollback(session):
+    session.info.pop("written_keys", None)
+
+
+def get_db(request: Request):
     db = SessionLocal()
+    db.info["client_key"] = _client_key(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request):
+    """
+    Session for read-only routes: the replica when one is configured, unless
+    a write touching this request's userId / patientId (or X-Client-Id) was
+    committed in the last READ_YOUR_WRITES_SECONDS.
+    """
+    if ReadSessionLocal is SessionLocal or _wrote_recently(_read_keys(request)):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
     try:
         yield db
     finally:
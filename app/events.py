@@ -0,0 +1,202 @@
+# app/events.py
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Set
+
+from app.config import EVENT_BROKER, EVENT_QUEUE_SIZE
+
+logger = logging.getLogger("uvicorn.error")
+
+PG_CHANNEL = "medi_events"
+
+
+class Subscription:
+    """
+    One SSE client. Events are handed over to the subscriber's event loop
+    with call_soon_threadsafe because publishers run in the threadpool.
+    """
+
+    def __init__(self, topic: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.topic = topic
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # loop already closed, the stream is going away anyway
+            pass
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        # slow consumer: drop the oldest event rather than grow without bound
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class Broker(ABC):
+    """Pub/sub interface. Subclass and pass to set_broker() to plug in another transport."""
+
+    @abstractmethod
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, topic: str) -> Subscription:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, sub: Subscription) -> None:
+        ...
+
+
+class InProcessBroker(Broker):
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self._queue_size = queue_size
+        self._subs: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        self._fan_out(topic, event)
+
+    def _fan_out(self, topic: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subs = list(self._subs.get(topic, ()))
+        for sub in subs:
+            sub.deliver(event)
+
+    def subscribe(self, topic: str) -> Subscription:
+        sub = Subscription(topic, asyncio.get_running_loop(), self._queue_size)
+        with self._lock:
+            self._subs.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.topic]
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Cross-worker fan-out via LISTEN/NOTIFY. Every worker publishes with
+    pg_notify and a listener thread re-publishes what it hears to the
+    local subscribers, so a chunk notified on worker A reaches a dashboard
+    connected to worker B.
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self._listener: Optional[threading.Thread] = None
+
+    def publish(self, topic: str, event: Dict[str, Any]) -> None:
+        from sqlalchemy import text
+        from app.db import engine
+
+        payload = json.dumps({"topic": topic, "event": event}, default=str)
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": PG_CHANNEL, "payload": payload})
+
+    def subscribe(self, topic: str) -> Subscription:
+        self._ensure_listener()
+        return super().subscribe(topic)
+
+    def _ensure_listener(self) -> None:
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen_forever, name="event-listener", daemon=True)
+                self._listener.start()
+
+    def _listen_forever(self) -> None:
+        import psycopg2
+        from app.db import engine
+
+        # A dedicated connection, not one from the request pool: it stays
+        # in autocommit + LISTEN mode for the life of the process.
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {PG_CHANNEL}")
+                logger.info("Events: listening on channel '%s'", PG_CHANNEL)
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        try:
+                            msg = json.loads(note.payload)
+                            self._fan_out(msg["topic"], msg["event"])
+                        except Exception as e:
+                            logger.warning("Events: bad notification payload: %s", e)
+            except Exception as e:
+                logger.warning("Events: listener failed, reconnecting: %s", e)
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+_broker: Optional[Broker] = None
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        if EVENT_BROKER == "memory":
+            _broker = InProcessBroker()
+        elif EVENT_BROKER == "postgres":
+            _broker = PostgresBroker()
+        else:
+            raise RuntimeError(f"Unknown EVENT_BROKER '{EVENT_BROKER}'. Use 'memory' or 'postgres'.")
+    return _broker
+
+
+def set_broker(broker: Broker) -> None:
+    global _broker
+    _broker = broker
+
+
+def session_topic(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def user_topic(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def publish_session_event(event_type: str, session_id: str, user_id: Optional[str], **data: Any) -> None:
+    """
+    Push an event to the session's topic and, if known, the owning user's topic.
+    Never raises: a broken broker must not fail the write that triggered it.
+    """
+    event = {"type": event_type, "sessionId": session_id, "userId": user_id, "ts": time.time(), **data}
+    try:
+        broker = get_broker()
+        broker.publish(session_topic(session_id), event)
+        if user_id:
+            broker.publish(user_topic(user_id), event)
+    except Exception as e:
+        logger.warning("Events: publish %s for %s failed: %s", event_type, session_id, e)
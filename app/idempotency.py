@@ -0,0 +1,162 @@
+# app/idempotency.py
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS
+from app.db import SessionLocal
+
+logger = logging.getLogger("uvicorn.error")
+
+MAX_KEY_LENGTH = 255
+PURGE_EVERY = 100  # delete expired rows on every Nth stored key
+
+# full key -> (expires monotonic, request hash, status code, response json)
+_cache: "OrderedDict[str, Tuple[float, str, int, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stored = 0
+_stored_lock = threading.Lock()
+
+
+def _full_key(scope: str, key: str, body: BaseModel) -> str:
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters")
+    # keys are only unique per client, so scope them to the user as well
+    return f"{scope}:{getattr(body, 'userId', '')}:{key}"
+
+
+def request_hash(body: BaseModel) -> str:
+    raw = json.dumps(body.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_get(full_key: str) -> Optional[Tuple[str, int, str]]:
+    with _cache_lock:
+        entry = _cache.get(full_key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _cache[full_key]
+            return None
+        _cache.move_to_end(full_key)
+        return entry[1], entry[2], entry[3]
+
+
+def _cache_put(full_key: str, req_hash: str, status_code: int, body: str, ttl: float) -> None:
+    with _cache_lock:
+        _cache[full_key] = (time.monotonic() + ttl, req_hash, status_code, body)
+        _cache.move_to_end(full_key)
+        while len(_cache) > IDEMPOTENCY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _replay(req_hash: str, stored: Tuple[str, int, str]) -> JSONResponse:
+    stored_hash, status_code, body = stored
+    if stored_hash != req_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+    return JSONResponse(content=json.loads(body), status_code=status_code, headers={"Idempotent-Replayed": "true"})
+
+
+def replay(db: Session, scope: str, key: Optional[str], body: BaseModel) -> Optional[JSONResponse]:
+    """
+    Return the stored response for (scope, userId, key) if this request was already
+    handled, None if it is new. Raises 422 when the key comes back with a
+    different body.
+    """
+    if not key:
+        return None
+    full_key = _full_key(scope, key, body)
+    req_hash = request_hash(body)
+
+    cached = _cache_get(full_key)
+    if cached is not None:
+        return _replay(req_hash, cached)
+
+    row = db.get(models.IdempotencyKey, full_key)
+    if row is None:
+        return None
+    expires_at = row.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        # clear the stale row so record() can reuse the key in this transaction
+        db.delete(row)
+        db.flush()
+        return None
+    stored = (row.request_hash, row.status_code, row.response_body)
+    _cache_put(full_key, *stored, ttl=remaining)
+    return _replay(req_hash, stored)
+
+
+def record(db: Session, scope: str, key: Optional[str], body: BaseModel, payload: Any, status_code: int = 200) -> None:
+    """
+    Stage the response for (scope, key) in the caller's transaction, so the
+    created row and its idempotency record commit (or fail) together. A
+    concurrent request with the same key then fails the commit with an
+    IntegrityError instead of writing a duplicate.
+    """
+    global _stored
+    if not key:
+        return
+    full_key = _full_key(scope, key, body)
+    req_hash = request_hash(body)
+    response_body = json.dumps(payload, default=str)
+    now = datetime.now(timezone.utc)
+
+    db.add(models.IdempotencyKey(
+        key=full_key,
+        request_hash=req_hash,
+        status_code=status_code,
+        response_body=response_body,
+        expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    ))
+    db.info.setdefault("idempotency_pending", []).append((full_key, req_hash, status_code, response_body))
+
+    with _stored_lock:
+        _stored += 1
+        purge = _stored % PURGE_EVERY == 0
+    if purge:
+        db.info["idempotency_purge"] = True
+
+
+def _purge_expired() -> None:
+    # own session/transaction, after the caller's commit, so the DELETE never
+    # holds up (or rolls back) the create it piggybacks on
+    db = SessionLocal()
+    try:
+        db.query(models.IdempotencyKey).filter(
+            models.IdempotencyKey.expires_at < datetime.now(timezone.utc)
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Idempotency: purging expired keys failed: %s", e)
+    finally:
+        db.close()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _cache_committed(session):
+    for full_key, req_hash, status_code, response_body in session.info.pop("idempotency_pending", ()):
+        _cache_put(full_key, req_hash, status_code, response_body, ttl=IDEMPOTENCY_TTL_SECONDS)
+    if session.info.pop("idempotency_purge", False):
+        _purge_expired()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_pending(session):
+    session.info.pop("idempotency_pending", None)
+    session.info.pop("idempotency_purge", None)
@@ -0,0 +1,418 @@
+# app/jobs.py
+import importlib
+import json
+import logging
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, event, func, or_, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import (
+    JOB_ENGINE,
+    JOB_FAST_WORKERS,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_SECONDS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_USER_CONCURRENCY,
+    JOB_WORKERS,
+)
+from app.compaction import complete_chunks
+from app.db import SessionLocal
+from app.events import publish_session_event
+
+logger = logging.getLogger("uvicorn.error")
+
+LANE_PRIORITY = {"fast": 0, "accurate": 1}
+ALL_LANES = list(LANE_PRIORITY)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Processing engines
+# ---------------------------------------------------------------------------
+
+class ProcessingEngine(ABC):
+    """
+    Plug-in point for the actual post-processing. `job` is a plain dict with
+    jobId, sessionId, userId, lane, model, template, templateId and chunks
+    (chunk numbers in order; fetch audio with app.compaction.read_chunk).
+    Return a JSON-serialisable result; raise to have the job retried.
+    """
+
+    @abstractmethod
+    def process(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+
+class StubEngine(ProcessingEngine):
+    """Local/testing engine: does no work and echoes what it was given."""
+
+    def process(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        logger.info("StubEngine: processing %s (%s chunks, model=%s)", job["sessionId"], len(job["chunks"]), job["model"])
+        return {
+            "engine": "stub",
+            "chunks": len(job["chunks"]),
+            "model": job["model"],
+            "templateId": job["templateId"],
+        }
+
+
+def load_engine(path: Optional[str] = JOB_ENGINE) -> ProcessingEngine:
+    module_name, _, attr = (path or "").partition(":")
+    if not attr:
+        raise RuntimeError(f"JOB_ENGINE must look like 'package.module:ClassName', got '{path}'")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+# ---------------------------------------------------------------------------
+# Queue operations
+# ---------------------------------------------------------------------------
+
+def lane_for_model(model: Optional[str]) -> str:
+    return "fast" if (model or "").lower() == "fast" else "accurate"
+
+
+def enqueue_session_job(
+    db: Session,
+    session_id: str,
+    user_id: Optional[str],
+    model: Optional[str] = None,
+    template: Optional[str] = None,
+    template_id: Optional[str] = None,
+) -> bool:
+    """
+    Add the post-processing job for a session (at most one per session) to
+    the caller's transaction, so it commits together with the isLast chunk.
+    The job starts out "waiting" and is released by release_if_complete()
+    once no chunk before the last is missing. Returns False if the session
+    already had a job.
+    """
+    J = models.ProcessingJob
+    if db.query(J.id).filter(J.session_id == session_id).first() is not None:
+        return False
+    lane = lane_for_model(model)
+    try:
+        # savepoint: a duplicate isLast notify racing us must not undo the chunk
+        with db.begin_nested():
+            db.add(J(
+                session_id=session_id,
+                user_id=user_id,
+                lane=lane,
+                priority=LANE_PRIORITY[lane],
+                status="waiting",
+                template=template,
+                template_id=template_id,
+                model=model,
+                attempts=0,
+                max_attempts=JOB_MAX_ATTEMPTS,
+                run_after=_utcnow(),
+            ))
+    except IntegrityError:
+        return False
+    return True
+
+
+def release_if_complete(db: Session, session_id: str) -> bool:
+    """
+    Move the session's "waiting" job to "queued" once every chunk up to the
+    last one has been recorded. Called on every notify, so chunks that land
+    after isLast (out of order) still release the job. Part of the caller's
+    transaction; the workers are woken once it commits.
+    """
+    J = models.ProcessingJob
+    if db.query(J.id).filter(J.session_id == session_id, J.status == "waiting").first() is None:
+        return False
+    if complete_chunks(db, session_id) is None:
+        return False
+    now = _utcnow()
+    released = (
+        db.query(J)
+        .filter(J.session_id == session_id, J.status == "waiting")
+        .update({J.status: "queued", J.run_after: now, J.updated_at: now}, synchronize_session=False)
+    )
+    if released:
+        db.info["jobs_wake"] = True
+    return bool(released)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("jobs_wake", False):
+        _pool.wake()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_wake(session):
+    session.info.pop("jobs_wake", None)
+
+
+def claim_next(db: Session, worker_id: str, lanes: List[str]) -> Optional[int]:
+    """
+    Lease the next runnable job in `lanes`, honouring priority and the
+    per-user concurrency cap. Expired leases (crashed workers) are claimable
+    again. Uses SELECT ... FOR UPDATE SKIP LOCKED on Postgres; on SQLite the
+    conditional UPDATE below is what keeps two workers off the same row.
+
+    The busy_users filter is only a hint: two workers can both see a user
+    under the cap. Claims for one user are therefore serialised (a
+    transaction-scoped advisory lock on Postgres, the database write lock
+    on SQLite) and the cap is re-counted after the claim UPDATE.
+    """
+    J = models.ProcessingJob
+    now = _utcnow()
+
+    busy_users = (
+        select(J.user_id)
+        .where(J.status == "running", J.lease_expires_at > now, J.user_id.isnot(None))
+        .group_by(J.user_id)
+        .having(func.count(J.id) >= JOB_USER_CONCURRENCY)
+    )
+    runnable = or_(
+        and_(J.status == "queued", J.run_after <= now),
+        and_(J.status == "running", J.lease_expires_at <= now),
+    )
+    job = (
+        db.query(J)
+        .filter(J.lane.in_(lanes), runnable)
+        .filter(or_(J.user_id.is_(None), J.user_id.notin_(busy_users)))
+        .order_by(J.priority, J.run_after, J.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        db.rollback()
+        return None
+
+    if job.attempts >= job.max_attempts:
+        # lease ran out on the final attempt
+        job.status = "failed"
+        job.lease_expires_at = None
+        job.last_error = job.last_error or "lease expired"
+        job.updated_at = now
+        db.commit()
+        return None
+
+    user_id = job.user_id
+    if user_id is not None and db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:user_id))"), {"user_id": user_id})
+
+    updated = (
+        db.query(J)
+        .filter(J.id == job.id, J.status == job.status, J.attempts == job.attempts)
+        .update(
+            {
+                J.status: "running",
+                J.attempts: J.attempts + 1,
+                J.lease_expires_at: now + timedelta(seconds=JOB_LEASE_SECONDS),
+                J.locked_by: worker_id,
+                J.updated_at: now,
+            },
+            synchronize_session=False,
+        )
+    )
+    if updated and user_id is not None:
+        running = (
+            db.query(func.count(J.id))
+            .filter(J.user_id == user_id, J.status == "running", J.lease_expires_at > now)
+            .scalar()
+        )
+        if running > JOB_USER_CONCURRENCY:
+            # another worker claimed for this user since our snapshot
+            db.rollback()
+            return None
+    job_id = job.id
+    db.commit()
+    return job_id if updated else None
+
+
+class _LeaseKeeper:
+    """
+    Extends a claimed job's lease every third of JOB_LEASE_SECONDS while the
+    engine runs, so a long job is not reclaimed by another worker. Only
+    renews while (locked_by, attempts) still match this claim.
+    """
+
+    def __init__(self, job_id: int, worker_id: str, attempt: int):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.attempt = attempt
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            db = SessionLocal()
+            try:
+                if not _owned(db, self.job_id, self.worker_id, self.attempt).update(
+                    {models.ProcessingJob.lease_expires_at: _utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)},
+                    synchronize_session=False,
+                ):
+                    self.lost = True
+                    logger.warning("Job %s: lease lost by %s", self.job_id, self.worker_id)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning("Job %s: lease renewal failed: %s", self.job_id, e)
+            finally:
+                db.close()
+
+
+def _owned(db: Session, job_id: int, worker_id: str, attempt: int):
+    J = models.ProcessingJob
+    return db.query(J).filter(J.id == job_id, J.status == "running", J.locked_by == worker_id, J.attempts == attempt)
+
+
+def run_job(db: Session, job_id: int, engine: ProcessingEngine, worker_id: str) -> None:
+    J = models.ProcessingJob
+    job = db.get(J, job_id)
+    attempt = job.attempts
+    chunks = [
+        n for (n,) in db.query(models.AudioChunk.chunk_number)
+        .filter(models.AudioChunk.session_id == job.session_id)
+        .distinct()
+        .order_by(models.AudioChunk.chunk_number)
+    ]
+    payload = {
+        "jobId": job.id,
+        "sessionId": job.session_id,
+        "userId": job.user_id,
+        "lane": job.lane,
+        "model": job.model,
+        "template": job.template,
+        "templateId": job.template_id,
+        "chunks": chunks,
+    }
+    session_id, user_id, max_attempts = job.session_id, job.user_id, job.max_attempts
+    # don't hold a transaction open while the engine works
+    db.rollback()
+
+    error = None
+    with _LeaseKeeper(job_id, worker_id, attempt):
+        try:
+            result = engine.process(payload)
+        except Exception as e:
+            error = e
+
+    # Every final write is fenced on (locked_by, attempts): if the lease was
+    # lost and the job re-claimed, this worker's outcome is discarded.
+    now = _utcnow()
+    if error is not None:
+        logger.warning("Job %s for %s failed (attempt %s/%s): %s", job_id, session_id, attempt, max_attempts, error)
+        values = {J.last_error: str(error)[:2000], J.lease_expires_at: None, J.updated_at: now}
+        if attempt < max_attempts:
+            values[J.status] = "queued"
+            values[J.run_after] = now + timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+        else:
+            values[J.status] = "failed"
+        if not _owned(db, job_id, worker_id, attempt).update(values, synchronize_session=False):
+            db.rollback()
+            logger.warning("Job %s: lease lost, discarding failure from %s", job_id, worker_id)
+            return
+        db.commit()
+        if values[J.status] == "failed":
+            publish_session_event("session.processing_failed", session_id, user_id, error=str(error)[:2000])
+        return
+
+    if not _owned(db, job_id, worker_id, attempt).update(
+        {
+            J.status: "done",
+            J.result: json.dumps(result, default=str),
+            J.lease_expires_at: None,
+            J.updated_at: now,
+        },
+        synchronize_session=False,
+    ):
+        db.rollback()
+        logger.warning("Job %s: lease lost, discarding result from %s", job_id, worker_id)
+        return
+    session = db.get(models.Session, session_id)
+    if session is not None:
+        session.status = "processed"
+    db.commit()
+    publish_session_event("session.processed", session_id, user_id, status="processed", jobId=job_id)
+
+
+# ---------------------------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------------------------
+
+class WorkerPool:
+    def __init__(self):
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._engine: Optional[ProcessingEngine] = None
+
+    def start(self, workers: int = JOB_WORKERS, fast_workers: int = JOB_FAST_WORKERS) -> None:
+        if self._threads or workers + fast_workers <= 0:
+            return
+        if not JOB_ENGINE:
+            logger.info("Jobs: JOB_ENGINE not set, no workers started (jobs stay queued)")
+            return
+        self._engine = load_engine()
+        self._stop.clear()
+        lanes = [(ALL_LANES, "w")] * workers + [(["fast"], "fast")] * fast_workers
+        for i, (worker_lanes, kind) in enumerate(lanes):
+            worker_id = f"{os.getpid()}-{kind}{i}-{uuid.uuid4().hex[:6]}"
+            t = threading.Thread(target=self._loop, args=(worker_id, worker_lanes), name=f"job-{kind}{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info("Jobs: started %s workers (%s fast-only) with %s", len(self._threads), fast_workers, JOB_ENGINE)
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def _loop(self, worker_id: str, lanes: List[str]) -> None:
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                job_id = claim_next(db, worker_id, lanes)
+                if job_id is not None:
+                    run_job(db, job_id, self._engine, worker_id)
+                    continue
+            except Exception:
+                db.rollback()
+                logger.exception("Jobs: worker %s loop failed", worker_id)
+            finally:
+                db.close()
+            self._wakeup.wait(JOB_POLL_SECONDS)
+            self._wakeup.clear()
+
+
+_pool = WorkerPool()
+
+
+def start_workers() -> None:
+    _pool.start()
+
+
+def stop_workers() -> None:
+    _pool.stop()
@@ -3,7 +3,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.compaction import start_sweeper, stop_sweeper
 from app.db import init_db
+from app.jobs import start_workers, stop_workers
 from fastapi.staticfiles import StaticFiles
 
 # If these modules exist, keep these imports.
@@ -11,6 +13,9 @@ from fastapi.staticfiles import StaticFiles
 from app.api import patients as patients_api
 from app.api import recordings as recordings_api
 from app.api import templates as templates_api  # comment if you don't have this file
+from app.api import exports as exports_api
+from app.api import debug as debug_api
+from app.profiling import ProfilingMiddleware
 
 
 # THIS is what uvicorn is looking for: a top-level variable named "app"
@@ -26,6 +31,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling (X-Profile header / PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
 
 @app.get("/")
 def health():
@@ -36,7 +44,16 @@ def health():
 def on_startup():
     # Initialize DB (create tables if not present)
     init_db()
-    pass
+    # Post-upload processing workers (only when JOB_ENGINE is set)
+    start_workers()
+    # Retries missed or half-finished compactions (only with COMPACTION_ENABLED)
+    start_sweeper()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_sweeper()
+    stop_workers()
 
 
 # Include routers – these define the /v1/... endpoints
@@ -44,6 +61,8 @@ app.include_router(patients_api.router)
 app.include_router(patients_api.user_router)
 app.include_router(templates_api.router)   
 app.include_router(recordings_api.router)
+app.include_router(exports_api.router)
+app.include_router(debug_api.router)
 
 # Serve local uploaded files under /static
 from app.config import FILE_STORAGE_DIR
@@ -1,6 +1,6 @@
 # app/models.py
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 
 Base = declarative_base()
@@ -45,3 +45,48 @@ class Template(Base):
     template_id = Column(String, unique=True, index=True)
     name = Column(String, nullable=False)
     user_id = Column(String, index=True, nullable=True)  # null = default/global
+
+class SessionArchive(Base):
+    __tablename__ = "session_archives"
+    session_id = Column(String, primary_key=True, index=True)
+    storage_path = Column(String, nullable=False)
+    # JSON list of [chunk_number, offset, length] into the archive object
+    chunk_index = Column(Text, nullable=False)
+    total_bytes = Column(Integer, nullable=False)
+    # set once the per-chunk objects are deleted; the sweeper retries until then
+    chunks_removed = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)  # "<endpoint>:<Idempotency-Key header>"
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(String, index=True, nullable=True)
+    lane = Column(String, nullable=False, default="accurate")  # "fast" / "accurate"
+    priority = Column(Integer, nullable=False, default=1)  # lower runs first
+    status = Column(String, nullable=False, default="waiting")  # waiting / queued / running / done / failed
+    template = Column(String, nullable=True)
+    template_id = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_processing_jobs_claim", "status", "lane", "priority", "run_after"),
+    )
@@ -0,0 +1,272 @@
+# app/profiling.py
+#
+# Opt-in per-request profiling. A request is profiled when it carries
+# `X-Profile: <PROFILE_TOKEN>` or is picked by PROFILE_SAMPLE_RATE. The
+# endpoint then runs under cProfile (wall clock), its thread CPU time is
+# measured and every SQL statement is timed. Results go into a bounded ring
+# buffer, downloadable as pstats files from /v1/debug/profiles.
+#
+# Requests that are not profiled pay one header scan in the middleware and
+# one ContextVar read in the route wrapper. The SQL hooks are only installed
+# when profiling is configured at all.
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from fastapi import Header, HTTPException
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import PROFILE_BUFFER_SIZE, PROFILE_SAMPLE_RATE, PROFILE_TOKEN
+
+PROFILE_HEADER = b"x-profile"
+DEBUG_PREFIX = "/v1/debug/"
+
+
+def token_matches(value: Optional[str]) -> bool:
+    if not PROFILE_TOKEN or value is None:
+        return False
+    return hmac.compare_digest(value.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.created_at = time.time()
+        self.status: Optional[int] = None
+        self.wall_ms = 0.0
+        self.cpu_ms = 0.0
+        self.sql_ms = 0.0
+        self.sql_count = 0
+        self.stats: Optional[bytes] = None  # marshalled pstats dict
+        self._lock = threading.Lock()
+
+    def add_sql(self, elapsed: float) -> None:
+        with self._lock:
+            self.sql_ms += elapsed * 1000
+            self.sql_count += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "createdAt": self.created_at,
+            "status": self.status,
+            "wallMs": round(self.wall_ms, 3),
+            "cpuMs": round(self.cpu_ms, 3),
+            "sqlMs": round(self.sql_ms, 3),
+            "sqlCount": self.sql_count,
+            "hasStats": self.stats is not None,
+        }
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+_profiles: Deque[RequestProfile] = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+
+
+def recent_profiles() -> List[RequestProfile]:
+    with _profiles_lock:
+        return list(_profiles)
+
+
+def get_profile(profile_id: str) -> Optional[RequestProfile]:
+    for p in recent_profiles():
+        if p.id == profile_id:
+            return p
+    return None
+
+
+def render_text(profile: RequestProfile, limit: int = 50) -> str:
+    if profile.stats is None:
+        return ""
+    out = io.StringIO()
+    stats = pstats.Stats(_StatsHolder(marshal.loads(profile.stats)), stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+class _StatsHolder:
+    # pstats.Stats accepts any object with create_stats()/stats
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# ASGI middleware: decides which requests get profiled
+# ---------------------------------------------------------------------------
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _reason(self, scope) -> Optional[str]:
+        # Never profile the profile download endpoints themselves: they carry
+        # the same header and would push real profiles out of the buffer.
+        if scope.get("path", "").startswith(DEBUG_PREFIX):
+            return None
+        if PROFILE_TOKEN:
+            for name, value in scope.get("headers") or ():
+                if name == PROFILE_HEADER:
+                    if token_matches(value.decode("latin-1")):
+                        return "header"
+                    break
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        reason = self._reason(scope)
+        if reason is None:
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope.get("method", ""), scope.get("path", ""), reason)
+        token = _current.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message.get("status")
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-profile-id", profile.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.wall_ms = (time.perf_counter() - started) * 1000
+            _current.reset(token)
+            with _profiles_lock:
+                _profiles.append(profile)
+
+
+# ---------------------------------------------------------------------------
+# Route class: runs the endpoint itself under cProfile
+# ---------------------------------------------------------------------------
+
+# cProfile hooks are per thread, and on Python 3.11 enabling a second
+# profiler silently replaces the first. All async endpoints share the event
+# loop thread, so only one of them may hold a profiler at a time; overlapping
+# async requests get timings (wall/CPU/SQL) without call stats.
+_loop_profiler = threading.Lock()
+
+
+def _start(profile: RequestProfile) -> Optional[cProfile.Profile]:
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: a profiler is already active elsewhere in the process
+        return None
+    return profiler
+
+
+def _finish(profile: RequestProfile, profiler: Optional[cProfile.Profile]) -> None:
+    if profiler is None:
+        return
+    profiler.disable()
+    profiler.create_stats()
+    profile.stats = marshal.dumps(profiler.stats)
+
+
+def _profiled(endpoint: Callable) -> Callable:
+    # include_router() rebuilds every route from the already wrapped endpoint
+    if getattr(endpoint, "__profiled__", False):
+        return endpoint
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            # Note: on the event loop thread this also catches other
+            # coroutines that run while the endpoint awaits.
+            owns_loop_profiler = _loop_profiler.acquire(blocking=False)
+            profiler = _start(profile) if owns_loop_profiler else None
+            cpu_started = time.thread_time()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.cpu_ms += (time.thread_time() - cpu_started) * 1000
+                _finish(profile, profiler)
+                if owns_loop_profiler:
+                    _loop_profiler.release()
+        async_wrapper.__profiled__ = True
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def sync_wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profiler = _start(profile)
+        cpu_started = time.thread_time()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.cpu_ms += (time.thread_time() - cpu_started) * 1000
+            _finish(profile, profiler)
+    sync_wrapper.__profiled__ = True
+    return sync_wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Use as `APIRouter(route_class=ProfiledRoute)` so endpoints can be profiled."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# SQLAlchemy hooks: time every statement of a profiled request
+# ---------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info["profile_query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    started = conn.info.pop("profile_query_start", None)
+    if started is not None:
+        profile.add_sql(time.perf_counter() - started)
+
+
+if PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def require_profile_token(x_profile: Optional[str] = Header(None)):
+    if not PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling disabled")
+    if not token_matches(x_profile):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+    return True
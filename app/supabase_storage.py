@@ -1,5 +1,5 @@
 # app/supabase_storage.py
-from typing import Optional
+from typing import List, Optional
 
 import logging
 from supabase import create_client
@@ -94,3 +94,38 @@ def get_signed_url(object_key: str, expires_in: int = 3600) -> str:
     if not url:
         raise RuntimeError("Failed to create signed URL")
     return url
+
+
+def download_object(object_key: str) -> bytes:
+    client = get_client()
+    return client.storage.from_(SUPABASE_BUCKET).download(object_key)
+
+
+def download_range(object_key: str, start: int, length: int) -> bytes:
+    """Fetch bytes [start, start + length) of an object with an HTTP Range request."""
+    import httpx
+
+    url = get_signed_url(object_key, expires_in=60)
+    resp = httpx.get(url, headers={"Range": f"bytes={start}-{start + length - 1}"}, timeout=30)
+    resp.raise_for_status()
+    if resp.status_code == 200:
+        # server ignored the Range header and sent the whole object
+        return resp.content[start:start + length]
+    return resp.content
+
+
+def upload_file(local_path: str, object_key: str, content_type: str) -> None:
+    client = get_client()
+    with open(local_path, "rb") as f:
+        client.storage.from_(SUPABASE_BUCKET).upload(
+            object_key,
+            f,
+            file_options={"content-type": content_type, "upsert": "true"},
+        )
+
+
+def remove_objects(object_keys: List[str]) -> None:
+    if not object_keys:
+        return
+    client = get_client()
+    client.storage.from_(SUPABASE_BUCKET).remove(object_keys)